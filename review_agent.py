@@ -1,72 +1,58 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import logging
 import os
+import re
+from pathlib import PurePosixPath
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.prebuilt import create_react_agent
 
-from tools import fetch_pr_files_tool, post_inline_comments_tool
+from standards import get_standards_index
+from tools import (
+    Comment,
+    GitHubPRReviewer,
+    PRFile,
+    close_reviewer,
+    create_github_client,
+    fetch_pr_files_tool,
+    get_reviewer,
+    load_cache,
+    post_inline_comments_tool,
+    save_cache,
+    valid_comment_lines,
+)
 
+logger = logging.getLogger(__name__)
 
-class PRReviewAgent:
-    def __init__(self):
-        load_dotenv()
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        self.llm = self._init_llm()
-        self.tools = [fetch_pr_files_tool, post_inline_comments_tool]
-        self.standards = self._load_combined_standards()
-        self.agent = self._create_agent()
-
-    def _init_llm(self):
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables.")
-        return ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", temperature=0, google_api_key=self.api_key
-        )
+DEFAULT_MODEL = "gemini-2.0-flash"
+# Small diffs don't need the full model; a cheaper tier reviews them as well.
+LITE_MODEL = "gemini-2.0-flash-lite"
+LITE_MODEL_MAX_ADDED_LINES = 20
 
-    def _load_standards_file(self, filename: str) -> str:
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                return f.read()
-        except Exception:
-            return ""
-
-    def _load_combined_standards(self) -> str:
-        clean_code = self._load_standards_file("clean_code_standards.md")
-        angular_code = self._load_standards_file("angular_code_standards.md")
-        csharp_code = self._load_standards_file("csharp_code_standards.md")
-        return f"{clean_code}\n\n{angular_code}\n\n{csharp_code}"
-
-    def _create_agent(self):
-        user_instruction = f"""
-    You are a highly experienced Senior Software Engineer and an exceptionally meticulous Code Reviewer.
-    Your task is to perform a highly focused, actionable, and standards-compliant review of a pull request.
-    You must strictly adhere to the following guidelines:
-    **1. Initial Setup & Review Scope:**
-    * Call *`fetch_pr_files_tool`* to retrieve the PR diff. You MUST call this **only once** per review session.
-    * Review the patch using the following comprehensive code standards:
-        {self.standards}
-    * **Review Scope Exclusion:** Ignore comments within code files, markdown/documentation files, and test files. Focus your review solely on necessary functional code changes.
-    **2. Commenting Guidelines (CRITICAL for Accuracy & Value):**
-    * Provide all review suggestions by calling `post_inline_comments_tool`. 
-    You MUST call `post_inline_comments_tool` **only once** per review session. DO NOT post same or similar review for same line multiple times.
-    * **Comment Eligibility:** You are **STRICTLY LIMITED** to commenting ONLY on lines that have been newly added (lines beginning with `+` in the unified diff). Do NOT post comments on removed lines (`-`) or unchanged context lines.
-    * **Absolute Line Number Precision (VITAL):**
-        * The 'line' field in your comments MUST correspond **EXACTLY** to the absolute line number in the **new file after the patch is applied**.
-        ***Line Counting Method:** To determine the absolute line number, count all lines starting from the beginning of the new file. You should include both **added lines (`+`) AND context lines (lines starting with a space `)`** in your count.
-        ***Do NOT count** removed lines (`-`) or any diff hunk headers (`@@ -x,y +a,b @@`) towards the line count. Hunk headers are metadata and must be skipped. Example:** For the patch `@@ -0,0 +1,30 @@\n+<div class="tenant-container">\n+  <h2>Tenant Management</h2>\n+  \n+  <div *ngIf="tenantList && tenantList.length > 0 && GetFormattedDate() === '2023-05-30'">\n+    <div class="tenant-item" *ngFor="let tenant of tenantList" \n+          [ngClass]="{{'active-tenant': tenant.isActive, 'tenant-warning': tenant.status === 'warning'}}">\n+      \n+      <h3>{{ tenant.name }}</h3>", it should be interpreted like the following:
-        ```diff
-           @@ -0,0 +1,7 @@
-           +1: <div class="tenant-container">
-          +2:  <h2>Tenant Management</h2>
-          +3:   
-          +4:   <div *ngIf="tenantList && tenantList.length > 0 &&         
-                GetFormattedDate() === '2023-05-30'">
-          +5:  <div class="tenant-item" *ngFor="let tenant of tenantList"
-          +6:  [ngClass]="{{'active-tenant': tenant.isActive, 
-                    'tenant-warning': tenant.status === 'warning'}}">
-          +7:  
-           ``` 
-           So if the review is for the line <div *ngIf="tenantList && tenantList.length > 0 && GetFormattedDate() === '2023-05-30'"> then it is on line 4 and if review is for line [ngClass]="{{'active-tenant': tenant.isActive, 'tenant-warning': tenant.status === 'warning'}}"> then it is line 6. The line number is very crucial and it should be accurate. Otherwise the review will not be useful.
+# Diff tokens sent per LLM call; larger PRs are split and batches are capped by it.
+TOKEN_BUDGET = 60_000
+CHARS_PER_TOKEN = 4
+# Batch prompting amortises the prompt over several PRs per call.
+MAX_BATCH_SIZE = 6
+MAX_CONCURRENT_LLM_CALLS = 3
+# Keeps the standards query within the embedding model's input limit.
+STANDARDS_QUERY_MAX_CHARS = 8_000
+
+
+_CODE_FENCE = re.compile(r"^```[\w-]*\s*|\s*```$")
+_PR_BLOCK = re.compile(
+    r'<pr id="?([^">]+)"?>\s*<comments>(.*?)</comments>\s*</pr>', re.DOTALL
+)
+
+# Commenting rules shared by the single-PR and the batched review prompts.
+REVIEW_GUIDELINES = """\
+    * **Comment Eligibility:** You are **STRICTLY LIMITED** to commenting ONLY on newly added lines, i.e. the lines listed in each file's `added_lines`. Do NOT post comments on removed lines (`-`) or unchanged context lines.
+    * **Line Numbers (VITAL):** Each entry in `added_lines` already carries the exact absolute line number in the **new file after the patch is applied**. Use that `line` value directly for the 'line' field of your comment; never count lines in the patch yourself.
     * **Content-Line Alignment (ABSOLUTELY CRUCIAL):**
         * Before submitting *any* comment, you **MUST thoroughly examine the specific line number** and logically verify that your review `body` **directly relates to and accurately describes an issue in the code visible at that exact line**.
         * Do NOT post a comment if the code snippet you're referencing isn't present or relevant to the specified line. For example, if you comment on line X, the issue described in your 'body' must originate from, or be clearly visible and addressable at, line X. DO NOT mention a `print()` issue if that line does not contain a `print()` statement.
@@ -80,27 +66,381 @@ class PRReviewAgent:
         * Direct violations of the provided code standards
         * Missing null checks, error handling, or edge case validation
     * **Optimization:** Always consider opportunities for optimization; methods should prefer bulk operations (e.g., batch gets/updates/deletes) wherever applicable.
-    * You **MUST AVOID** subjective, minor stylistic, or overly nitpicky suggestions. Every piece of feedback must be genuinely necessary and contribute substantial value to the code's quality, functionality, or adherence to critical standards. If you are unsure whether something is worth commenting on, **skip it**.
-    **4. Finalization & Tool Usage:**
-        * You MUST ONLY use the provided tools (`fetch_pr_files_tool`, `post_inline_comments_tool`). Do not generate any explanations or freeform text responses.
-    * **IMPORTANT:** After you have posted all necessary and validated comments using `post_inline_comments_tool`, you MUST **STOP** and do not call any more tools.
+    * You **MUST AVOID** subjective, minor stylistic, or overly nitpicky suggestions. Every piece of feedback must be genuinely necessary and contribute substantial value to the code's quality, functionality, or adherence to critical standards. If you are unsure whether something is worth commenting on, **skip it**."""
+
+
+def _review_instruction(standards: List[str]) -> str:
+    joined_standards = "\n\n".join(standards)
+    return f"""
+    You are a highly experienced Senior Software Engineer and an exceptionally meticulous Code Reviewer.
+    Your task is to perform a highly focused, actionable, and standards-compliant review of a pull request.
+    The pull request is given as a JSON list of its files, their patches and their added lines.
+    You must strictly adhere to the following guidelines:
+    **1. Review Scope:**
+    * Review the patches using the following code standards:
+        {joined_standards}
+    * **Review Scope Exclusion:** Ignore comments within code files, markdown/documentation files, and test files. Focus your review solely on necessary functional code changes.
+    **2. Commenting Guidelines (CRITICAL for Accuracy & Value):**
+    * Return all review suggestions together in a single response. DO NOT post same or similar review for same line multiple times.
+{REVIEW_GUIDELINES}
+    **4. Output Format:**
+    * Emit each comment as a JSON object with `path`, `line` and `body` fields on its own line (JSON Lines). Emit nothing when the pull request needs no comments.
+    * Do not wrap the output in a JSON array or code fence, and do not generate any explanations or freeform text.
+    """
+
+
+def _batch_instruction(standards: List[str]) -> str:
+    joined_standards = "\n\n".join(standards)
+    return f"""
+    You are a highly experienced Senior Software Engineer and an exceptionally meticulous Code Reviewer.
+    Your task is to perform a highly focused, actionable, and standards-compliant review of several independent pull requests at once.
+    Each pull request is delimited by `[PR-<id>]` and `[/PR-<id>]` and contains a JSON list of its files, their patches and their added lines.
+    You must strictly adhere to the following guidelines:
+    **1. Review Scope:**
+    * Review every pull request on its own. A comment MUST only be attached to the pull request whose code it describes.
+    * Review the patches using the following code standards:
+        {joined_standards}
+    * **Review Scope Exclusion:** Ignore comments within code files, markdown/documentation files, and test files. Focus your review solely on necessary functional code changes.
+    **2. Commenting Guidelines (CRITICAL for Accuracy & Value):**
+    * DO NOT post same or similar review for same line multiple times.
+{REVIEW_GUIDELINES}
+    **4. Output Format:**
+    * For every pull request, emit exactly one block `<pr id=ID><comments>[...]</comments></pr>`, where the JSON array holds objects with `path`, `line` and `body` fields. Use an empty array when a pull request needs no comments.
+    * Do not generate any explanations or freeform text outside these blocks.
     """
-        return create_react_agent(
-            model=self.llm, tools=self.tools, prompt=user_instruction
+
+
+def _is_comment(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("path"), str)
+        and isinstance(value.get("line"), int)
+        and isinstance(value.get("body"), str)
+    )
+
+
+def _parse_comment_line(line: str) -> Optional[Comment]:
+    """Parses one JSON Lines comment, ignoring blank, malformed or stray lines."""
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None
+    if not _is_comment(value):
+        return None
+    return {"path": value["path"], "line": value["line"], "body": value["body"]}
+
+
+def _count_tokens(text: str) -> int:
+    # A character-based estimate needs no tokenizer download or API call.
+    return len(text) // CHARS_PER_TOKEN
+
+
+T = TypeVar("T")
+
+
+def _pack(
+    items: List[T], cost: Callable[[T], int], max_items: Optional[int] = None
+) -> List[List[T]]:
+    """Greedily packs items, in order, into bins that fit within TOKEN_BUDGET."""
+    bins: List[List[T]] = []
+    current: List[T] = []
+    used = 0
+    for item in items:
+        item_cost = cost(item)
+        if current and (len(current) == max_items or used + item_cost > TOKEN_BUDGET):
+            bins.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += item_cost
+    if current:
+        bins.append(current)
+    return bins
+
+
+@functools.cache
+def _init_llm(model: str) -> ChatGoogleGenerativeAI:
+    """Creates one Gemini client per model, shared by every reviewer in the process."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables.")
+    return ChatGoogleGenerativeAI(model=model, temperature=0, google_api_key=api_key)
+
+
+class PRReviewAgent:
+    def __init__(
+        self,
+        llm: Optional[ChatGoogleGenerativeAI] = None,
+        use_cache: bool = True,
+        force_repost: bool = False,
+    ):
+        # An injected LLM reviews every diff, bypassing the model-tier selection.
+        self._injected_llm = llm
+        self.use_cache = use_cache
+        self.force_repost = force_repost
+        self.llm = llm or _init_llm(DEFAULT_MODEL)
+
+    @staticmethod
+    def _select_model(files: List[PRFile]) -> Optional[str]:
+        """
+        Picks the cheapest model tier able to review the diff, or None when
+        the diff only adds blank lines and there is nothing to review.
+        """
+        added = sum(
+            1 for f in files for line in f["added_lines"] if line["content"].strip()
         )
+        if added == 0:
+            return None
+        if added < LITE_MODEL_MAX_ADDED_LINES:
+            return LITE_MODEL
+        return DEFAULT_MODEL
+
+    @staticmethod
+    def _cache_key(files: List[PRFile]) -> str:
+        payload = json.dumps(files, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()[:16]
 
     def run_review(self):
-        print("🚀 Starting PR review agent...")
-        _ = self.agent.invoke(
+        asyncio.run(self._run_review())
+
+    async def _run_review(self):
+        print("🚀 Starting PR review...")
+        try:
+            files = await fetch_pr_files_tool.ainvoke({})
+            if not files:
+                print("ℹ️ No files to review.")
+                return
+            cache_name = f"{self._cache_key(files)}.json"
+            comments = load_cache(cache_name) if self.use_cache else None
+            if comments is not None:
+                print("♻️ Diff unchanged since last review, replaying cached comments.")
+            elif (model := self._select_model(files)) is None:
+                print("ℹ️ Only blank lines were added, skipping the LLM review.")
+                comments = []
+            else:
+                # Oversized diffs are reviewed in token-bounded chunks, then merged
+                # so the review is still posted only once.
+                llm = self._injected_llm or _init_llm(model)
+                chunks = _pack(files, lambda f: _count_tokens(json.dumps(f)))
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+                results = await asyncio.gather(
+                    *(self._review_files(llm, chunk, semaphore) for chunk in chunks)
+                )
+                comments = [c for chunk_comments, _ in results for c in chunk_comments]
+                if all(parsed for _, parsed in results):
+                    save_cache(cache_name, comments)
+                else:
+                    logger.warning("Unparseable LLM output; not caching this review.")
+            reviewer = get_reviewer()
+            if self.force_repost and reviewer:
+                reviewer.forget_posted()
+            print(
+                await post_inline_comments_tool.ainvoke(
+                    {"comments": comments, "valid_lines": valid_comment_lines(files)}
+                )
+            )
+        finally:
+            await close_reviewer()
+        print("✅ Review completed.")
+
+    async def _review_files(
+        self,
+        llm: ChatGoogleGenerativeAI,
+        files: List[PRFile],
+        semaphore: asyncio.Semaphore,
+    ) -> Tuple[List[Comment], bool]:
+        """
+        Reviews a subset of the PR's files with a single LLM call, parsing each
+        comment as soon as its line has streamed in. Also returns whether the
+        whole reply could be parsed.
+        """
+        standards = await asyncio.to_thread(self._retrieve_standards, files)
+        messages = [
+            SystemMessage(content=_review_instruction(standards)),
+            HumanMessage(content=json.dumps(files)),
+        ]
+        comments: List[Comment] = []
+        dropped: List[str] = []
+
+        def collect(lines: List[str]) -> None:
+            for line in lines:
+                comment = _parse_comment_line(line)
+                if comment:
+                    comments.append(comment)
+                elif line.strip() and not line.strip().startswith("```"):
+                    dropped.append(line)
+
+        text = pending = ""
+        async with semaphore:
+            async for chunk in llm.astream(messages):
+                text += chunk.content
+                pending += chunk.content
+                *complete_lines, pending = pending.split("\n")
+                collect(complete_lines)
+        collect([pending])
+        if dropped and not comments:
+            # The model may still answer with a plain JSON array instead of JSON Lines.
+            fallback = self._parse_comments(_CODE_FENCE.sub("", text.strip()))
+            if fallback is not None:
+                return fallback, True
+        for line in dropped:
+            logger.warning(f"Dropped unparseable LLM output line: {line[:200]}")
+        return comments, not dropped
+
+    def run_reviews_batch(self, pr_numbers: List[str]):
+        asyncio.run(self._run_reviews_batch(pr_numbers))
+
+    async def _run_reviews_batch(self, pr_numbers: List[str]):
+        print(f"🚀 Starting batched review of {len(pr_numbers)} PRs...")
+        token = os.getenv("TOKEN_GITHUB")
+        client = create_github_client(token or "")
+        try:
+            try:
+                reviewers = {
+                    pr: GitHubPRReviewer(
+                        token, os.getenv("GITHUB_REPO"), pr, client=client
+                    )
+                    for pr in pr_numbers
+                }
+            except ValueError as e:
+                logger.error(f"GitHubPRReviewer initialization failed: {e}")
+                return
+            if self.force_repost:
+                for reviewer in reviewers.values():
+                    reviewer.forget_posted()
+            fetched = await asyncio.gather(
+                *(reviewer.fetch_pr_files() for reviewer in reviewers.values())
+            )
+            files_by_pr = {pr: files for pr, files in zip(reviewers, fetched) if files}
+
+            comments_by_pr: Dict[str, List[Comment]] = {}
+            pending: Dict[str, List[PRFile]] = {}
+            for pr, files in files_by_pr.items():
+                cache_name = f"{self._cache_key(files)}.json"
+                cached = load_cache(cache_name) if self.use_cache else None
+                if cached is not None:
+                    comments_by_pr[pr] = cached
+                else:
+                    pending[pr] = files
+
+            if pending:
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+                results = await asyncio.gather(
+                    *(
+                        self._review_batch(batch, semaphore)
+                        for batch in _pack(
+                            list(pending.items()),
+                            lambda item: _count_tokens(json.dumps(item[1])),
+                            max_items=MAX_BATCH_SIZE,
+                        )
+                    )
+                )
+                for reviewed in results:
+                    for pr, comments in reviewed.items():
+                        save_cache(f"{self._cache_key(pending[pr])}.json", comments)
+                        comments_by_pr[pr] = comments
+
+            outcomes = await asyncio.gather(
+                *(
+                    reviewers[pr].post_inline_comments(
+                        comments, valid_comment_lines(files_by_pr[pr])
+                    )
+                    for pr, comments in comments_by_pr.items()
+                )
+            )
+            for pr, outcome in zip(comments_by_pr, outcomes):
+                print(f"PR #{pr}: {outcome}")
+        finally:
+            await client.aclose()
+        print("✅ Batched review completed.")
+
+    @staticmethod
+    def _retrieve_standards(files: List[PRFile]) -> List[str]:
+        """Retrieves the code standards most relevant to the given files' changes."""
+        extensions = sorted(
             {
-                "messages": [
-                    {"role": "user", "content": "Please start the Pull Request review."}
-                ]
+                PurePosixPath(f["filename"]).suffix
+                for f in files
+                if PurePosixPath(f["filename"]).suffix
             }
         )
-        print("✅ Review completed.")
+        # The changed filenames and added code are what the standards must match.
+        query = "\n".join(
+            [f["filename"] for f in files]
+            + [line["content"] for f in files for line in f["added_lines"]]
+        )
+        return get_standards_index().search(
+            query[:STANDARDS_QUERY_MAX_CHARS], extensions
+        )
+
+    async def _review_batch(
+        self,
+        batch: List[Tuple[str, List[PRFile]]],
+        semaphore: asyncio.Semaphore,
+    ) -> Dict[str, List[Comment]]:
+        """Reviews several PRs with one LLM call and splits the reply per PR."""
+        files_by_pr = dict(batch)
+        standards = await asyncio.to_thread(
+            self._retrieve_standards,
+            [f for files in files_by_pr.values() for f in files],
+        )
+        diffs = "\n".join(
+            f"[PR-{pr}]\n{json.dumps(files)}\n[/PR-{pr}]"
+            for pr, files in files_by_pr.items()
+        )
+        async with semaphore:
+            response = await self.llm.ainvoke(
+                [
+                    SystemMessage(content=_batch_instruction(standards)),
+                    HumanMessage(content=diffs),
+                ]
+            )
+        reviewed: Dict[str, List[Comment]] = {}
+        for pr, raw_comments in _PR_BLOCK.findall(response.content):
+            comments = self._parse_comments(raw_comments)
+            if pr in files_by_pr and comments is not None:
+                reviewed[pr] = comments
+        for pr in files_by_pr.keys() - reviewed.keys():
+            print(f"⚠️ No usable review returned for PR #{pr}.")
+        return reviewed
+
+    @staticmethod
+    def _parse_comments(raw_comments: str) -> Optional[List[Comment]]:
+        try:
+            comments = json.loads(raw_comments)
+        except ValueError:
+            return None
+        if not isinstance(comments, list):
+            return None
+        return [
+            {"path": c["path"], "line": c["line"], "body": c["body"]}
+            for c in comments
+            if _is_comment(c)
+        ]
 
 
 if __name__ == "__main__":
-    reviewer = PRReviewAgent()
-    reviewer.run_review()
+    parser = argparse.ArgumentParser(description="Run the ReviewPal PR review agent.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached reviews and always run the LLM on the diff.",
+    )
+    parser.add_argument(
+        "--prs",
+        nargs="+",
+        metavar="PR_NUMBER",
+        help="Review several PRs of GITHUB_REPO in batched LLM calls instead of PR_NUMBER.",
+    )
+    parser.add_argument(
+        "--force-repost",
+        action="store_true",
+        help="Post every comment again, even those already posted on the PR.",
+    )
+    args = parser.parse_args()
+    reviewer = PRReviewAgent(
+        use_cache=not args.no_cache, force_repost=args.force_repost
+    )
+    if args.prs:
+        reviewer.run_reviews_batch(args.prs)
+    else:
+        reviewer.run_review()
@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from typing_extensions import TypedDict
+
+from tools import load_cache, save_cache
+
+logger = logging.getLogger(__name__)
+
+# Standards files mapped to the file extensions they apply to (None = every file).
+STANDARDS_FILES: Dict[str, Optional[Tuple[str, ...]]] = {
+    "clean_code_standards.md": None,
+    "angular_code_standards.md": (".ts", ".html", ".scss", ".css"),
+    "c#_code_standards.md": (".cs",),
+}
+EMBEDDING_MODEL = "models/text-embedding-004"
+TOP_K = 5
+
+_HEADING = re.compile(r"^#{1,3} ", re.MULTILINE)
+
+
+# --- TypedDict for indexed standards sections ---
+class StandardsChunk(TypedDict):
+    source: str
+    text: str
+
+
+def _load_standards_file(filename: str) -> str:
+    try:
+        return Path(filename).read_bytes().decode("utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning(f"Could not read standards file {filename}: {e}")
+        return ""
+
+
+def _chunk_standards() -> List[StandardsChunk]:
+    """Splits every standards file into one chunk per markdown heading."""
+    chunks: List[StandardsChunk] = []
+    for filename in STANDARDS_FILES:
+        content = _load_standards_file(filename)
+        starts = [m.start() for m in _HEADING.finditer(content)]
+        bounds = [0, *starts] if not starts or starts[0] else starts
+        for start, end in zip(bounds, [*bounds[1:], len(content)]):
+            text = content[start:end].strip()
+            if text:
+                chunks.append({"source": filename, "text": text})
+    return chunks
+
+
+def _normalize_extension(extension: str) -> str:
+    extension = extension.strip().lower()
+    return extension if extension.startswith(".") else f".{extension}"
+
+
+class StandardsIndex:
+    """
+    An in-memory embedding index over the code standards sections.
+    """
+
+    def __init__(self, embeddings: GoogleGenerativeAIEmbeddings):
+        self.embeddings = embeddings
+        self.chunks = _chunk_standards()
+        self.vectors = self._load_vectors()
+
+    def _load_vectors(self) -> np.ndarray:
+        """Embeds the chunks, reusing the persisted vectors while the standards are unchanged."""
+        if not self.chunks:
+            logger.warning("No standards sections found; reviews will cite none.")
+            return np.empty((0, 0), dtype=np.float32)
+        digest = hashlib.sha256(EMBEDDING_MODEL.encode("utf-8"))
+        for chunk in self.chunks:
+            digest.update(chunk["text"].encode("utf-8"))
+        cache_name = f"standards-index-{digest.hexdigest()[:16]}.json"
+        vectors = load_cache(cache_name)
+        if vectors is None:
+            logger.info(f"Embedding {len(self.chunks)} standards sections.")
+            vectors = self.embeddings.embed_documents(
+                [chunk["text"] for chunk in self.chunks]
+            )
+            save_cache(cache_name, vectors)
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(self.chunks), -1)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def search(self, query: str, extensions: List[str], k: int = TOP_K) -> List[str]:
+        """Returns the k sections most similar to the query for the given file types."""
+        wanted = {_normalize_extension(ext) for ext in extensions}
+        candidates = [
+            i
+            for i, chunk in enumerate(self.chunks)
+            if STANDARDS_FILES[chunk["source"]] is None
+            or wanted.intersection(STANDARDS_FILES[chunk["source"]])
+        ]
+        if not candidates:
+            return []
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        scores = self.vectors[candidates] @ query_vector
+        best = np.argsort(scores)[::-1][:k]
+        return [self.chunks[candidates[i]]["text"] for i in best]
+
+
+# Review chunks retrieve standards from worker threads; only one may build the index.
+_index_lock = threading.Lock()
+
+
+@functools.cache
+def _build_standards_index() -> StandardsIndex:
+    return StandardsIndex(
+        GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL, google_api_key=os.getenv("GEMINI_API_KEY")
+        )
+    )
+
+
+def get_standards_index() -> StandardsIndex:
+    """Builds the standards index once per process, on first use."""
+    with _index_lock:
+        return _build_standards_index()
@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+from review_agent import PRReviewAgent, _parse_comment_line
+from tools import dedupe_comments, parse_added_lines
+
+
+def test_parse_added_lines_numbers_lines_across_hunks():
+    patch = (
+        "@@ -1,3 +1,3 @@\n"
+        " import os\n"
+        "-import sys\n"
+        "+import re\n"
+        " \n"
+        "@@ -10,2 +10,3 @@ def main():\n"
+        "     run()\n"
+        "+    stop()\n"
+        "     exit()\n"
+        "\\ No newline at end of file\n"
+        "+    return 0"
+    )
+    assert parse_added_lines(patch) == [
+        {"line": 2, "content": "import re"},
+        {"line": 11, "content": "    stop()"},
+        {"line": 13, "content": "    return 0"},
+    ]
+
+
+def test_parse_added_lines_keeps_unicode_line_separators_inside_a_line():
+    patch = "@@ -1,2 +1,3 @@\n a\n+x = 'a\x0cb'\n+y = 1\n b"
+    assert parse_added_lines(patch) == [
+        {"line": 2, "content": "x = 'a\x0cb'"},
+        {"line": 3, "content": "y = 1"},
+    ]
+
+
+def test_dedupe_comments_drops_exact_duplicates():
+    comment = {"path": "a.py", "line": 1, "body": "Use a context manager."}
+    other_line = {**comment, "line": 2}
+    assert dedupe_comments([comment, dict(comment), other_line]) == [
+        comment,
+        other_line,
+    ]
+
+
+def test_dedupe_comments_keeps_the_longest_near_duplicate():
+    short = {"path": "a.py", "line": 1, "body": "Rename x to a clearer name here"}
+    longer = {**short, "body": "Rename x to a clearer name here, please"}
+    unrelated = {**short, "body": "This loop never terminates."}
+    assert dedupe_comments([short, longer, unrelated]) == [longer, unrelated]
+
+
+def test_parse_comment_line_skips_fences_and_garbage():
+    lines = [
+        "```json",
+        '{"path": "a.py", "line": 3, "body": "Missing await.", "severity": "high"}',
+        "Here are my comments:",
+        '{"path": "a.py", "line": "3", "body": "Line is not an int."}',
+        "[]",
+        "```",
+    ]
+    assert [c for c in map(_parse_comment_line, lines) if c] == [
+        {"path": "a.py", "line": 3, "body": "Missing await."}
+    ]
+
+
+class _FakeLLM:
+    def __init__(self, content: str):
+        self.content = content
+
+    async def ainvoke(self, messages):
+        return SimpleNamespace(content=self.content)
+
+
+def test_review_batch_splits_reply_per_pr(monkeypatch):
+    monkeypatch.setattr(
+        PRReviewAgent, "_retrieve_standards", staticmethod(lambda files: [])
+    )
+    reply = (
+        '<pr id="5"><comments>[{"path": "a.py", "line": 1, "body": "Nit."}]'
+        "</comments></pr>\n"
+        "<pr id=6><comments>[not json]</comments></pr>\n"
+        "<pr id=9><comments>[]</comments></pr>"
+    )
+    agent = PRReviewAgent(llm=_FakeLLM(reply))
+    batch = [("5", []), ("6", [])]
+    reviewed = asyncio.run(agent._review_batch(batch, asyncio.Semaphore(1)))
+    assert reviewed == {"5": [{"path": "a.py", "line": 1, "body": "Nit."}]}
@@ -1,20 +1,96 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
 import logging
+import math
 import os
-from typing import Dict, List, Optional
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 import httpx
+import orjson
+import pathspec
 from dotenv import load_dotenv
 from langchain_core.tools import tool
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 from typing_extensions import TypedDict
 
-# --- Load environment variables ---
-load_dotenv()
+# --- Load environment variables once per process ---
+if not os.getenv("_REVIEWPAL_DOTENV_LOADED"):
+    load_dotenv()
+    os.environ["_REVIEWPAL_DOTENV_LOADED"] = "1"
 
 # --- Setup logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
+# GitHub caps `/pulls/{n}/files` at 100 entries per page.
+FILES_PER_PAGE = 100
+# Upper bound on in-flight requests, to stay clear of GitHub's secondary rate limits.
+MAX_CONCURRENT_REQUESTS = 10
+
+# Longest we sleep for a rate-limit reset before the next attempt.
+MAX_RATE_LIMIT_WAIT = 900
+
+# Request bodies are serialized with orjson, so their content type is set explicitly.
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# Summarises a PR's files in one call so patches are only downloaded when needed.
+PR_FILES_QUERY = """
+query($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      changedFiles
+      files(first: 100) {
+        pageInfo { hasNextPage endCursor }
+        nodes { path additions deletions }
+      }
+    }
+  }
+}
+"""
+
+# Tests, docs and lock/snapshot files are out of review scope, so they never reach the LLM.
+DEFAULT_IGNORE_PATTERNS = [
+    "test/",
+    "tests/",
+    "__tests__/",
+    "*.spec.*",
+    "*.test.*",
+    "doc/",
+    "docs/",
+    "*.md",
+    "*.rst",
+    "*.txt",
+    "*.lock",
+    "*.snap",
+]
+# gitignore-style patterns added to (or, with `!`, lifted from) the defaults.
+IGNORE_FILE = Path(".reviewpalignore")
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+# Comments on the same line whose wording overlaps more than this are merged.
+NEAR_DUPLICATE_SIMILARITY = 0.8
+
+# Working directory for review results and other state reused across runs.
+CACHE_DIR = Path(".reviewpal-cache")
+ETAGS_CACHE = "etags.json"
+POSTED_CACHE = "posted.json"
+
 
 # --- TypedDict for inline comments ---
 class Comment(TypedDict):
@@ -23,12 +99,179 @@ class Comment(TypedDict):
     body: str
 
 
+# --- TypedDicts for fetched PR files ---
+class AddedLine(TypedDict):
+    line: int
+    content: str
+
+
+class PRFile(TypedDict):
+    filename: str
+    patch: str
+    added_lines: List[AddedLine]
+
+
+@functools.cache
+def _ignore_spec() -> pathspec.PathSpec:
+    """
+    Compiles the review exclusions once per process: the defaults, then the
+    `.reviewpalignore` file, then the comma-separated `REVIEWPAL_INCLUDE`
+    patterns as overrides.
+    """
+    lines = list(DEFAULT_IGNORE_PATTERNS)
+    if IGNORE_FILE.is_file():
+        lines.extend(IGNORE_FILE.read_text(encoding="utf-8").splitlines())
+    lines.extend(
+        f"!{pattern.strip()}"
+        for pattern in os.getenv("REVIEWPAL_INCLUDE", "").split(",")
+        if pattern.strip()
+    )
+    return pathspec.PathSpec.from_lines("gitwildmatch", lines)
+
+
+def is_excluded(path: str) -> bool:
+    """Whether a changed file is out of review scope and should not be sent for review."""
+    return _ignore_spec().match_file(path)
+
+
+def _word_set(text: str) -> Set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    union = a | b
+    return len(a & b) / len(union) if union else 1.0
+
+
+def dedupe_comments(comments: List[Comment]) -> List[Comment]:
+    """
+    Drops repeated comments on the same line, keeping the longest body when
+    several near-identical comments were generated for it.
+    """
+    unique: List[Comment] = []
+    seen: Set[Tuple[str, int, bytes]] = set()
+    kept_on_line: Dict[Tuple[str, int], List[int]] = {}
+    for comment in comments:
+        body_digest = hashlib.blake2b(
+            comment["body"].encode("utf-8"), digest_size=8
+        ).digest()
+        key = (comment["path"], comment["line"], body_digest)
+        if key in seen:
+            continue
+        seen.add(key)
+        words = _word_set(comment["body"])
+        line_key = (comment["path"], comment["line"])
+        for index in kept_on_line.get(line_key, []):
+            kept = unique[index]
+            if _jaccard(words, _word_set(kept["body"])) > NEAR_DUPLICATE_SIMILARITY:
+                if len(comment["body"]) > len(kept["body"]):
+                    unique[index] = comment
+                break
+        else:
+            kept_on_line.setdefault(line_key, []).append(len(unique))
+            unique.append(comment)
+    if len(unique) < len(comments):
+        logger.info(
+            f"Deduplicated {len(comments)} comments down to {len(unique)} before posting."
+        )
+    return unique
+
+
+def _is_rate_limited(response: httpx.Response) -> bool:
+    return (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+    )
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """Retries rate limits, and transient failures where a retry cannot double-post."""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return error.request.method == "GET"
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status == 429 or (status == 403 and _is_rate_limited(error.response)):
+            return True
+        return status >= 500 and error.request.method == "GET"
+    return False
+
+
+_exponential_backoff = wait_exponential_jitter(initial=1, max=60)
+
+
+def _wait_for_rate_limit(retry_state: RetryCallState) -> float:
+    """Waits for GitHub's advertised rate-limit reset, else backs off exponentially."""
+    error = retry_state.outcome.exception()
+    if isinstance(error, httpx.HTTPStatusError):
+        headers = error.response.headers
+        if "retry-after" in headers:
+            return min(float(headers["retry-after"]), MAX_RATE_LIMIT_WAIT)
+        if (
+            headers.get("x-ratelimit-remaining") == "0"
+            and "x-ratelimit-reset" in headers
+        ):
+            wait = float(headers["x-ratelimit-reset"]) - time.time()
+            return min(max(wait, 0.0), MAX_RATE_LIMIT_WAIT)
+    return _exponential_backoff(retry_state)
+
+
+def comment_fingerprint(comment: Comment) -> str:
+    """Identifies a posted comment, so retries and reruns never post it twice."""
+    key = f"{comment['path']}|{comment['line']}|{comment['body']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def parse_added_lines(patch: str) -> List[AddedLine]:
+    """
+    Maps every added line of a unified diff patch to its absolute line number
+    in the new file: added and context lines advance the count, removed lines
+    and hunk headers do not.
+    """
+    added_lines: List[AddedLine] = []
+    new_line = 0
+    for raw_line in patch.split("\n"):
+        hunk = _HUNK_HEADER.match(raw_line)
+        if hunk:
+            new_line = int(hunk.group(1))
+        elif raw_line.startswith("+"):
+            added_lines.append({"line": new_line, "content": raw_line[1:]})
+            new_line += 1
+        elif not raw_line.startswith(("-", "\\")):
+            new_line += 1
+    return added_lines
+
+
+def valid_comment_lines(files: List[PRFile]) -> Dict[str, Set[int]]:
+    """Maps each file to the line numbers a review comment may be posted on."""
+    return {f["filename"]: {line["line"] for line in f["added_lines"]} for f in files}
+
+
+def github_headers(token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json",
+    }
+
+
+def create_github_client(token: str) -> httpx.AsyncClient:
+    """Creates a keep-alive client; HTTP/2 lets concurrent calls multiplex one connection."""
+    return httpx.AsyncClient(headers=github_headers(token), http2=True, timeout=30.0)
+
+
 class GitHubPRReviewer:
     """
     A class to interact with GitHub PR API for code review automation.
     """
 
-    def __init__(self, token: str, repo: str, pr_number: str):
+    def __init__(
+        self,
+        token: str,
+        repo: str,
+        pr_number: str,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
         if not token:
             raise ValueError("TOKEN_GITHUB is not set.")
         if not repo:
@@ -41,35 +284,217 @@ class GitHubPRReviewer:
         self.base_url = (
             f"https://api.github.com/repos/{self.repo}/pulls/{self.pr_number}"
         )
+        # Reviewers of the same repo may share one client; only an owned one is closed.
+        self._owns_client = client is None
+        self._client = client or create_github_client(token)
+        self._etags: Dict[str, str] = load_cache(ETAGS_CACHE) or {}
+        self._new_etags: Dict[str, str] = {}
 
     @property
     def headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self.token}",
-            "Accept": "application/vnd.github+json",
-        }
+        return github_headers(self.token)
+
+    async def aclose(self) -> None:
+        """Closes the underlying HTTP client and its pooled connections."""
+        if self._owns_client:
+            await self._client.aclose()
 
-    def fetch_pr_files(self) -> List[Dict[str, str]]:
-        """Fetches PR files with their patches."""
+    async def fetch_pr_files(self) -> List[PRFile]:
+        """
+        Fetches PR files with their patches and the absolute line numbers of
+        their added lines, following every result page.
+        """
         try:
-            response = httpx.get(f"{self.base_url}/files", headers=self.headers)
-            response.raise_for_status()
-            try:
-                files = response.json()
-                return [
-                    {"filename": f["filename"], "patch": f.get("patch", "")}
-                    for f in files
-                    if f.get("patch")
-                ]
-            except ValueError:
-                logger.error("Failed to parse JSON response while fetching files.")
-                return []
-        except httpx.RequestError as e:
+            overview = await self._fetch_pr_overview()
+            if overview is None:
+                files = await self._walk_files_pages()
+            else:
+                changed_files, reviewable = overview
+                if not reviewable:
+                    logger.info("No reviewable files in PR; skipping patch download.")
+                    return []
+                # The file count is known up front, so every page can go out at once.
+                last_page = max(1, math.ceil(changed_files / FILES_PER_PAGE))
+                files = await self._fetch_files_pages(range(1, last_page + 1))
+            self._save_etags()
+            in_scope = [f for f in files if not is_excluded(f["filename"])]
+            if len(in_scope) < len(files):
+                logger.info(
+                    f"Filtered {len(files) - len(in_scope)}/{len(files)} files "
+                    "excluded from review."
+                )
+            return [
+                {
+                    "filename": f["filename"],
+                    "patch": f["patch"],
+                    "added_lines": parse_added_lines(f["patch"]),
+                }
+                for f in in_scope
+                if f.get("patch")
+            ]
+        except ValueError:
+            logger.error("Failed to parse JSON response while fetching files.")
+            return []
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching PR files: {e}")
             return []
 
-    def post_inline_comments(self, comments: List[Comment]) -> str:
-        """Posts a batch of inline comments as a GitHub PR review."""
+    async def _fetch_pr_overview(self) -> Optional[Tuple[int, bool]]:
+        """
+        Returns the PR's changed-file count and whether any file is worth
+        downloading a patch for, using a single GraphQL round-trip.
+        """
+        owner, _, name = self.repo.partition("/")
+        if not (owner and name and self.pr_number.isdigit()):
+            logger.warning(
+                f"Cannot query GraphQL for {self.repo}#{self.pr_number}; "
+                "expected GITHUB_REPO as owner/name and a numeric PR_NUMBER."
+            )
+            return None
+        data = await self._graphql(
+            PR_FILES_QUERY,
+            {"owner": owner, "name": name, "number": int(self.pr_number)},
+        )
+        pull_request = ((data or {}).get("repository") or {}).get("pullRequest")
+        if not pull_request:
+            return None
+        files = pull_request["files"]
+        reviewable = files["pageInfo"]["hasNextPage"] or any(
+            self._is_reviewable(node) for node in files["nodes"]
+        )
+        return pull_request["changedFiles"], reviewable
+
+    @staticmethod
+    def _is_reviewable(node: Dict[str, Any]) -> bool:
+        # Only added lines can receive comments, so deletion-only files are skipped.
+        return node["additions"] > 0 and not is_excluded(node["path"])
+
+    async def _graphql(
+        self, query: str, variables: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Runs a GraphQL query, returning its `data` or None on any failure."""
+        try:
+            response = await self._request(
+                "POST",
+                GRAPHQL_URL,
+                content=orjson.dumps({"query": query, "variables": variables}),
+                headers=JSON_HEADERS,
+            )
+            payload = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"GraphQL request failed: {e}")
+            return None
+        if payload.get("errors"):
+            logger.warning(f"GraphQL query returned errors: {payload['errors']}")
+            return None
+        return payload.get("data")
+
+    async def _walk_files_pages(self) -> List[Dict[str, Any]]:
+        """Fetches page 1 over REST, then the pages advertised by its Link header."""
+        files, last_page = await self._get_files_page(1)
+        if last_page > 1:
+            files.extend(await self._fetch_files_pages(range(2, last_page + 1)))
+        return files
+
+    async def _fetch_files_pages(self, pages: Iterable[int]) -> List[Dict[str, Any]]:
+        """Fetches the given REST result pages concurrently and flattens them."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        results = await asyncio.gather(
+            *(self._fetch_files_page(page, semaphore) for page in pages)
+        )
+        return [f for page_files in results for f in page_files]
+
+    async def _fetch_files_page(
+        self, page: int, semaphore: asyncio.Semaphore
+    ) -> List[Dict[str, Any]]:
+        async with semaphore:
+            files, _ = await self._get_files_page(page)
+        return files
+
+    async def _get_files_page(self, page: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        GETs one REST page of PR files and the last page number. A page seen
+        before is revalidated with its ETag; a 304 replays it from the cache
+        without counting against the rate limit.
+        """
+        page_key = f"{self.repo}#{self.pr_number}:{page}"
+        page_digest = hashlib.sha256(page_key.encode("utf-8")).hexdigest()[:16]
+        body_name = f"files-{page_digest}.json"
+        cached = load_cache(body_name) if page_key in self._etags else None
+        headers = {"If-None-Match": self._etags[page_key]} if cached else {}
+        response = await self._request(
+            "GET",
+            f"{self.base_url}/files",
+            params={"per_page": FILES_PER_PAGE, "page": page},
+            headers=headers,
+        )
+        if response.status_code == 304:
+            return cached["files"], cached["last_page"]
+        files, last_page = response.json(), self._last_page(response)
+        etag = response.headers.get("etag")
+        if etag:
+            save_cache(body_name, {"files": files, "last_page": last_page})
+            self._new_etags[page_key] = etag
+        return files, last_page
+
+    def _save_etags(self) -> None:
+        """Merges this run's ETags into the shared file, keeping other PRs' entries."""
+        if self._new_etags:
+            save_cache(
+                ETAGS_CACHE, {**(load_cache(ETAGS_CACHE) or {}), **self._new_etags}
+            )
+            self._etags.update(self._new_etags)
+            self._new_etags = {}
+
+    @retry(
+        retry=retry_if_exception(_is_retryable),
+        wait=_wait_for_rate_limit,
+        stop=stop_after_attempt(5),
+        reraise=True,
+    )
+    async def _request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Sends a GitHub API request, retrying rate limits and transient failures."""
+        response = await self._client.request(method, url, **kwargs)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _last_page(response: httpx.Response) -> int:
+        """Reads the last page number from the `Link: rel="last"` header."""
+        last = response.links.get("last")
+        if not last:
+            return 1
+        return int(httpx.URL(last["url"]).params.get("page", 1))
+
+    async def post_inline_comments(
+        self,
+        comments: List[Comment],
+        valid_lines: Optional[Dict[str, Set[int]]] = None,
+    ) -> str:
+        """
+        Posts a batch of inline comments as a GitHub PR review. When
+        `valid_lines` is given, comments on any other (path, line) are dropped
+        up front, since GitHub would reject the whole review with a 422.
+        """
+        comments = dedupe_comments(comments)
+        if valid_lines is not None:
+            valid = [c for c in comments if c["line"] in valid_lines.get(c["path"], ())]
+            if len(valid) < len(comments):
+                logger.warning(
+                    f"Dropped {len(comments) - len(valid)} comments on lines "
+                    "that were not added in this PR."
+                )
+            if comments and not valid:
+                return "Skipped: no valid comments."
+            comments = valid
+        posted = self._posted_fingerprints()
+        unposted = [c for c in comments if comment_fingerprint(c) not in posted]
+        if len(unposted) < len(comments):
+            logger.info(
+                f"Skipping {len(comments) - len(unposted)} comments already posted."
+            )
+        comments = unposted
         if not comments:
             return "No comments to post."
 
@@ -82,49 +507,163 @@ class GitHubPRReviewer:
             "comments": comments,
         }
         try:
-            response = httpx.post(review_url, headers=self.headers, json=review_payload)
-            response.raise_for_status()
+            await self._request(
+                "POST",
+                review_url,
+                content=orjson.dumps(review_payload),
+                headers=JSON_HEADERS,
+            )
+            self._remember_posted(comments)
             return "Inline comments posted successfully."
-        except httpx.RequestError as e:
+        except httpx.HTTPError as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 422:
+                # Unprocessable comments are a no-op for the PR, not a failed run.
+                logger.warning(
+                    f"GitHub rejected the review comments: {e.response.text}"
+                )
+                return "Skipped: GitHub rejected the review comments as invalid."
             logger.error(f"Failed to post comments: {e}")
             return "Failed to post comments."
         except ValueError:
             logger.error("Error decoding JSON response when posting comments.")
             return "Error decoding JSON response when posting comments."
 
+    @property
+    def _posted_key(self) -> str:
+        return f"{self.repo}#{self.pr_number}"
 
-# --- Lazy Instantiation Helper ---
-def get_reviewer() -> Optional[GitHubPRReviewer]:
+    def _posted_fingerprints(self) -> Set[str]:
+        return set((load_cache(POSTED_CACHE) or {}).get(self._posted_key, []))
+
+    def _remember_posted(self, comments: List[Comment]) -> None:
+        posted = load_cache(POSTED_CACHE) or {}
+        fingerprints = set(posted.get(self._posted_key, []))
+        fingerprints.update(comment_fingerprint(c) for c in comments)
+        posted[self._posted_key] = sorted(fingerprints)
+        save_cache(POSTED_CACHE, posted)
+
+    def forget_posted(self) -> None:
+        """Clears this PR's posted-comment record, so every comment is posted again."""
+        posted = load_cache(POSTED_CACHE) or {}
+        if posted.pop(self._posted_key, None) is not None:
+            save_cache(POSTED_CACHE, posted)
+
+
+# --- Local Cache Helpers ---
+def load_cache(name: str) -> Optional[Any]:
+    """Reads a JSON entry from the cache directory, or None if it is missing."""
+    path = CACHE_DIR / name
     try:
-        return GitHubPRReviewer(
-            os.getenv("TOKEN_GITHUB"), os.getenv("GITHUB_REPO"), os.getenv("PR_NUMBER")
-        )
-    except ValueError as e:
-        logger.error(f"GitHubPRReviewer initialization failed: {e}")
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
         return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+
+
+def save_cache(name: str, data: Any) -> None:
+    """Writes a JSON entry atomically, so an interrupted run never leaves it torn."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    # A unique temp file per writer, so concurrent saves never clobber each other.
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=CACHE_DIR, suffix=".tmp", delete=False
+    ) as tmp:
+        tmp.write(json.dumps(data))
+    os.replace(tmp.name, CACHE_DIR / name)
+
+
+# --- Lazy Instantiation Helper ---
+_reviewer: Optional[GitHubPRReviewer] = None
+
+
+def get_reviewer() -> Optional[GitHubPRReviewer]:
+    global _reviewer
+    if _reviewer is None:
+        try:
+            _reviewer = GitHubPRReviewer(
+                os.getenv("TOKEN_GITHUB"),
+                os.getenv("GITHUB_REPO"),
+                os.getenv("PR_NUMBER"),
+            )
+        except ValueError as e:
+            logger.error(f"GitHubPRReviewer initialization failed: {e}")
+            return None
+    return _reviewer
+
+
+async def close_reviewer() -> None:
+    """Closes the shared reviewer's HTTP client once the review run is over."""
+    global _reviewer
+    if _reviewer is not None:
+        await _reviewer.aclose()
+        _reviewer = None
 
 
 # --- LangChain Tool Wrappers ---
 
 
 @tool
-def fetch_pr_files_tool() -> List[Dict[str, str]]:
+async def fetch_pr_files_tool() -> List[PRFile]:
     """
-    LangChain tool to fetch PR files and their patches.
+    LangChain tool to fetch PR files, their patches and their added lines.
     """
     reviewer = get_reviewer()
     if reviewer:
-        return reviewer.fetch_pr_files()
+        return await reviewer.fetch_pr_files()
     logger.warning("Reviewer not available.")
     return []
 
 
 @tool
-def post_inline_comments_tool(comments: List[Comment]) -> str:
+async def post_inline_comments_tool(
+    comments: List[Comment], valid_lines: Optional[Dict[str, Set[int]]] = None
+) -> str:
     """
     LangChain tool to post inline review comments to a PR.
     """
     reviewer = get_reviewer()
     if reviewer:
-        return reviewer.post_inline_comments(comments)
+        return await reviewer.post_inline_comments(comments, valid_lines)
     return "Reviewer not available. Cannot post comments."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smoke-test the GitHub PR reviewer.")
+    parser.add_argument(
+        "--post",
+        action="store_true",
+        help="Post a test comment on PR_NUMBER; by default only the files are fetched.",
+    )
+    args = parser.parse_args()
+
+    async def _main() -> None:
+        reviewer = get_reviewer()
+        if reviewer is None:
+            return
+        try:
+            files = await reviewer.fetch_pr_files()
+            logger.info(f"Fetched {len(files)} reviewable files.")
+            if not args.post:
+                logger.info("Dry run; pass --post to post a test comment.")
+                return
+            added = next((f for f in files if f["added_lines"]), None)
+            if added is None:
+                logger.info("No added lines to comment on.")
+                return
+            example_comments: List[Comment] = [
+                {
+                    "path": added["filename"],
+                    "line": added["added_lines"][0]["line"],
+                    "body": "ReviewPal smoke test comment.",
+                }
+            ]
+            logger.info(
+                await reviewer.post_inline_comments(
+                    example_comments, valid_comment_lines(files)
+                )
+            )
+        finally:
+            await close_reviewer()
+
+    asyncio.run(_main())